@@ -1,58 +1,82 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import BackgroundTasks, FastAPI, Request
 import uvicorn
 import logging
+import logging.handlers
 import json
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Dict, Any, Optional, Union, Literal
+import asyncio
+import contextlib
+import functools
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Annotated, AsyncGenerator, Callable, List, Dict, Any, NamedTuple, Optional, Tuple, Union, Literal
 import httpx
 import os
-from fastapi.responses import JSONResponse, StreamingResponse
+import queue
+import atexit
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 import litellm
+import orjson
 import uuid
 import time
 from dotenv import load_dotenv
 import re
-from datetime import datetime
 import sys
+import traceback
+from types import MappingProxyType
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Resolve the log levels once at import; everything below reuses these constants
+LOG_LEVEL = logging.WARNING  # Change to logging.INFO to show more details
+UVICORN_LOG_LEVEL = max(LOG_LEVEL, logging.WARNING)
+
 # Configure logging
 logging.basicConfig(
-    level=logging.WARN,  # Change to INFO level to show more details
+    level=LOG_LEVEL,
     format='%(asctime)s - %(levelname)s - %(message)s',
 )
+
+def find_no_caller(stack_info=False, stacklevel=1):
+    """Stand-in for Logger.findCaller that skips the per-record stack walk.
+
+    The proxy's log format never shows the file, line or function a record came
+    from, so walking the frames for them on every call is wasted work.
+    """
+    return "(unknown file)", 0, "(unknown function)", None
+
+# Only the proxy's own loggers skip it; the logger class stays untouched, so third-party
+# loggers (LiteLLM prints file:line) and any class another library installed keep theirs
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(f"{__name__}.access")
+for own_logger in (logger, access_logger):
+    own_logger.findCaller = find_no_caller
 
 # Configure uvicorn to be quieter
-import uvicorn
 # Tell uvicorn's loggers to be quiet
-logging.getLogger("uvicorn").setLevel(logging.WARNING)
-logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
+for uvicorn_logger_name in ("uvicorn", "uvicorn.access", "uvicorn.error"):
+    logging.getLogger(uvicorn_logger_name).setLevel(UVICORN_LOG_LEVEL)
 
 # Create a filter to block any log messages containing specific strings
 class MessageFilter(logging.Filter):
+    # Block messages containing these strings, matched in a single regex scan
+    blocked_phrases = re.compile("|".join(map(re.escape, [
+        "LiteLLM completion()",
+        "HTTP Request:", 
+        "selected model name for cost calculation",
+        "utils.py",
+        "cost_calculator"
+    ])))
+
     def filter(self, record):
-        # Block messages containing these strings
-        blocked_phrases = [
-            "LiteLLM completion()",
-            "HTTP Request:", 
-            "selected model name for cost calculation",
-            "utils.py",
-            "cost_calculator"
-        ]
-        
-        if hasattr(record, 'msg') and isinstance(record.msg, str):
-            for phrase in blocked_phrases:
-                if phrase in record.msg:
-                    return False
-        return True
+        return not (isinstance(record.msg, str) and self.blocked_phrases.search(record.msg))
+
+# Apply the filter to the noisy third-party loggers that emit these messages. Logger
+# filters only see records created on that logger, so other records skip it entirely
+message_filter = MessageFilter()
+for noisy_logger_name in ("LiteLLM", "LiteLLM Router", "LiteLLM Proxy", "httpx"):
+    logging.getLogger(noisy_logger_name).addFilter(message_filter)
 
-# Apply the filter to the root logger to catch all messages
 root_logger = logging.getLogger()
-root_logger.addFilter(MessageFilter())
 
 # Custom formatter for model mapping logs
 class ColorizedFormatter(logging.Formatter):
@@ -65,23 +89,97 @@ class ColorizedFormatter(logging.Formatter):
     BOLD = "\033[1m"
     
     def format(self, record):
-        if record.levelno == logging.debug and "MODEL MAPPING" in record.msg:
+        # Any record reaches the root handler, and msg is not always a string
+        if record.levelno == logging.DEBUG and isinstance(record.msg, str) and "MODEL MAPPING" in record.msg:
             # Apply colors and formatting to model mapping logs
-            return f"{self.BOLD}{self.GREEN}{record.msg}{self.RESET}"
+            return f"{self.BOLD}{self.GREEN}{record.getMessage()}{self.RESET}"
         return super().format(record)
 
-# Apply custom formatter to console handler
-for handler in logger.handlers:
+# Apply custom formatter to the console handler basicConfig put on the root logger (the
+# proxy's own logger has no handlers of its own), once, before it moves behind the queue
+for handler in root_logger.handlers:
     if isinstance(handler, logging.StreamHandler):
         handler.setFormatter(ColorizedFormatter('%(asctime)s - %(levelname)s - %(message)s'))
 
-app = FastAPI()
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records unformatted so the listener thread does the formatting as well as the I/O."""
+    def prepare(self, record):
+        return record
+
+    def emit(self, record):
+        # Both queues are unbounded SimpleQueues, whose put never blocks or fails
+        self.queue.put_nowait(record)
+
+# Hand log records to a background thread so formatting and stderr writes never
+# run on the event loop; the handlers configured above now live behind the queue
+# (importing the module a second time, e.g. as __main__ and as "server", must not wrap the
+# queue handler in another listener, so this only runs while the root has no queue handler)
+if not any(isinstance(h, logging.handlers.QueueHandler) for h in root_logger.handlers):
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    root_logger.handlers = [DeferredQueueHandler(log_queue)]
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+# The per-request access log goes to stdout, also through a queue so the write happens
+# on the listener thread; it always prints, whatever the root log level is
+if not access_logger.handlers:
+    access_log_handler = logging.StreamHandler(sys.stdout)
+    access_log_handler.setFormatter(logging.Formatter('%(message)s'))
+    access_log_queue = queue.SimpleQueue()
+    access_log_listener = logging.handlers.QueueListener(access_log_queue, access_log_handler)
+    access_logger.addHandler(DeferredQueueHandler(access_log_queue))
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    access_log_listener.start()
+    atexit.register(access_log_listener.stop)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on a missing API key instead of on the first mapped request
+    validate_provider_settings()
+    
+    # Share one pooled client across every LiteLLM call so upstream connections
+    # (and their TLS sessions) stay warm instead of being set up per request
+    litellm.aclient_session = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONCURRENT_LLM_CALLS + MAX_CONCURRENT_LLM_STREAMS,
+            max_keepalive_connections=MAX_CONCURRENT_LLM_CALLS + MAX_CONCURRENT_LLM_STREAMS,
+        ),
+        timeout=httpx.Timeout(litellm.request_timeout),
+    )
+    try:
+        yield
+    finally:
+        await litellm.aclient_session.aclose()
+        litellm.aclient_session = None
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Get API keys from environment
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
+# Cap concurrent upstream calls so bursts queue here instead of exhausting the
+# connection pool; open streams get their own cap, held until the stream ends, so
+# long-lived streams never starve non-streaming completions (and vice versa)
+MAX_CONCURRENT_LLM_CALLS = int(os.environ.get("MAX_CONCURRENT_LLM_CALLS", "64"))
+MAX_CONCURRENT_LLM_STREAMS = int(os.environ.get("MAX_CONCURRENT_LLM_STREAMS", "64"))
+LLM_CALL_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+LLM_STREAM_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_LLM_STREAMS)
+
+# Responses are built with model_construct from data LiteLLM already parsed; set
+# STRICT_RESPONSE_VALIDATION=true to re-validate them (e.g. when adding a provider)
+STRICT_RESPONSE_VALIDATION = os.environ.get("STRICT_RESPONSE_VALIDATION", "false").lower() == "true"
+
+# Provider prefix -> (API key, label); models without a known prefix use the Anthropic key.
+# Read-only, since it is shared by every request for the life of the process
+PROVIDER_API_KEYS = MappingProxyType({
+    "openai/": (OPENAI_API_KEY, "OpenAI"),
+    "gemini/": (GEMINI_API_KEY, "Gemini"),
+})
+
 # Get preferred provider (default to openai)
 PREFERRED_PROVIDER = os.environ.get("PREFERRED_PROVIDER", "openai").lower()
 
@@ -112,66 +210,170 @@ GEMINI_MODELS = [
     "gemini-2.0-flash"
 ]
 
+# Resolve the provider-prefixed targets for haiku/sonnet once; the provider
+# preference and model names are fixed for the life of the process
+def resolve_model_target(model_name: str) -> str:
+    """Prefix a configured model name with the provider it should be served by."""
+    if PREFERRED_PROVIDER == "google" and model_name in GEMINI_MODELS:
+        return f"gemini/{model_name}"
+    return f"openai/{model_name}"
+
+SMALL_MODEL_TARGET = resolve_model_target(SMALL_MODEL)
+BIG_MODEL_TARGET = resolve_model_target(BIG_MODEL)
+
+def validate_provider_settings() -> None:
+    """Check that the providers serving haiku/sonnet have API keys configured."""
+    for target in (SMALL_MODEL_TARGET, BIG_MODEL_TARGET):
+        api_key, provider_label = PROVIDER_API_KEYS[target[:target.find("/") + 1]]
+        if not api_key:
+            raise RuntimeError(f"{provider_label} API key is not set, but '{target}' is configured as a mapping target")
+
+# Model names come from a tiny set (haiku/sonnet aliases plus a few explicit names) and the
+# mapping only depends on environment settings read at import, so resolve each name once
+@functools.lru_cache(maxsize=128)
+def map_model_name(v: str) -> str:
+    """Map a requested Claude model name to the provider-prefixed model LiteLLM should call."""
+    original_model = v
+    new_model = v # Default to original value
+
+    logger.debug("📋 MODEL VALIDATION: Original='%s', Preferred='%s', BIG='%s', SMALL='%s'", original_model, PREFERRED_PROVIDER, BIG_MODEL, SMALL_MODEL)
+
+    # Remove provider prefixes for easier matching
+    clean_v = v
+    if clean_v.startswith('anthropic/'):
+        clean_v = clean_v[10:]
+    elif clean_v.startswith('openai/'):
+        clean_v = clean_v[7:]
+    elif clean_v.startswith('gemini/'):
+        clean_v = clean_v[7:]
+
+    # --- Mapping Logic --- START ---
+    mapped = False
+    # Map Haiku to SMALL_MODEL based on provider preference
+    if 'haiku' in clean_v.lower():
+        new_model = SMALL_MODEL_TARGET
+        mapped = True
+
+    # Map Sonnet to BIG_MODEL based on provider preference
+    elif 'sonnet' in clean_v.lower():
+        new_model = BIG_MODEL_TARGET
+        mapped = True
+
+    # Add prefixes to non-mapped models if they match known lists
+    elif not mapped:
+        if clean_v in GEMINI_MODELS and not v.startswith('gemini/'):
+            new_model = f"gemini/{clean_v}"
+            mapped = True # Technically mapped to add prefix
+        elif clean_v in OPENAI_MODELS and not v.startswith('openai/'):
+            new_model = f"openai/{clean_v}"
+            mapped = True # Technically mapped to add prefix
+    # --- Mapping Logic --- END ---
+
+    if mapped:
+        logger.debug("📌 MODEL MAPPING: '%s' ➡️ '%s'", original_model, new_model)
+    else:
+        # If no mapping occurred and no prefix exists, log warning or decide default
+        if not v.startswith(('openai/', 'gemini/', 'anthropic/')):
+            logger.warning("⚠️ No prefix or mapping rule for model: '%s'. Using as is.", original_model)
+        new_model = v # Ensure we return the original if no rule applied
+
+    return new_model
+
 # Helper function to clean schema for Gemini
+# String formats Gemini accepts in tool parameters; any other format is dropped
+GEMINI_STRING_FORMATS = frozenset({"enum", "date-time"})
+
 def clean_gemini_schema(schema: Any) -> Any:
-    """Recursively removes unsupported fields from a JSON schema for Gemini."""
+    """Recursively copies a JSON schema, leaving out fields unsupported by Gemini."""
     if isinstance(schema, dict):
-        # Remove specific keys unsupported by Gemini tool parameters
-        schema.pop("additionalProperties", None)
-        schema.pop("default", None)
-
-        # Check for unsupported 'format' in string types
-        if schema.get("type") == "string" and "format" in schema:
-            allowed_formats = {"enum", "date-time"}
-            if schema["format"] not in allowed_formats:
-                logger.debug(f"Removing unsupported format '{schema['format']}' for string type in Gemini schema.")
-                schema.pop("format")
-
-        # Recursively clean nested schemas (properties, items, etc.)
-        for key, value in list(schema.items()): # Use list() to allow modification during iteration
-            schema[key] = clean_gemini_schema(value)
+        # Check for unsupported 'format' in string types; the key is skipped while copying
+        drop_format = (
+            schema.get("type") == "string"
+            and "format" in schema
+            and schema["format"] not in GEMINI_STRING_FORMATS
+        )
+        if drop_format:
+            logger.debug("Removing unsupported format '%s' for string type in Gemini schema.", schema['format'])
+
+        # Skip specific keys unsupported by Gemini tool parameters while copying
+        cleaned = {}
+        for key, value in schema.items():
+            if key == "additionalProperties" or key == "default" or (drop_format and key == "format"):
+                continue
+            # Recursively clean nested schemas (properties, items, etc.)
+            cleaned[key] = clean_gemini_schema(value)
+        return cleaned
     elif isinstance(schema, list):
         # Recursively clean items in a list
         return [clean_gemini_schema(item) for item in schema]
     return schema
 
 # Models for Anthropic API requests
+# Request models are parsed once per call and never mutated afterwards
+REQUEST_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore")
+
 class ContentBlockText(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     type: Literal["text"]
     text: str
 
 class ContentBlockImage(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     type: Literal["image"]
     source: Dict[str, Any]
 
 class ContentBlockToolUse(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     type: Literal["tool_use"]
     id: str
     name: str
     input: Dict[str, Any]
 
 class ContentBlockToolResult(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     type: Literal["tool_result"]
     tool_use_id: str
     content: Union[str, List[Dict[str, Any]], Dict[str, Any], List[Any], Any]
 
+# Content blocks are told apart by their `type` tag
+ContentBlock = Annotated[
+    Union[ContentBlockText, ContentBlockImage, ContentBlockToolUse, ContentBlockToolResult],
+    Field(discriminator="type")
+]
+
 class SystemContent(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     type: Literal["text"]
     text: str
 
 class Message(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     role: Literal["user", "assistant"] 
-    content: Union[str, List[Union[ContentBlockText, ContentBlockImage, ContentBlockToolUse, ContentBlockToolResult]]]
+    content: Union[str, List[ContentBlock]]
 
 class Tool(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     name: str
     description: Optional[str] = None
     input_schema: Dict[str, Any]
 
 class ThinkingConfig(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     enabled: bool
 
 class MessagesRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    # Declared before `model` so the value its validator stores is not reset to the default
+    original_model: Optional[str] = None  # Will store the original model name
     model: str
     max_tokens: int
     messages: List[Message]
@@ -182,64 +384,20 @@ class MessagesRequest(BaseModel):
     top_p: Optional[float] = None
     top_k: Optional[int] = None
     metadata: Optional[Dict[str, Any]] = None
-    tools: Optional[List[Tool]] = None
+    tools: List[Tool] = Field(default_factory=list)
     tool_choice: Optional[Dict[str, Any]] = None
     thinking: Optional[ThinkingConfig] = None
-    original_model: Optional[str] = None  # Will store the original model name
     
+    # Clients may send "tools": null; it is stored as an empty list so the proxy never
+    # has to check for None
+    @field_validator('tools', mode='before')
+    def tools_null_as_empty(cls, v):
+        return [] if v is None else v
+
     @field_validator('model')
     def validate_model_field(cls, v, info): # Renamed to avoid conflict
         original_model = v
-        new_model = v # Default to original value
-
-        logger.debug(f"📋 MODEL VALIDATION: Original='{original_model}', Preferred='{PREFERRED_PROVIDER}', BIG='{BIG_MODEL}', SMALL='{SMALL_MODEL}'")
-
-        # Remove provider prefixes for easier matching
-        clean_v = v
-        if clean_v.startswith('anthropic/'):
-            clean_v = clean_v[10:]
-        elif clean_v.startswith('openai/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('gemini/'):
-            clean_v = clean_v[7:]
-
-        # --- Mapping Logic --- START ---
-        mapped = False
-        # Map Haiku to SMALL_MODEL based on provider preference
-        if 'haiku' in clean_v.lower():
-            if PREFERRED_PROVIDER == "google" and SMALL_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{SMALL_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{SMALL_MODEL}"
-                mapped = True
-
-        # Map Sonnet to BIG_MODEL based on provider preference
-        elif 'sonnet' in clean_v.lower():
-            if PREFERRED_PROVIDER == "google" and BIG_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{BIG_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{BIG_MODEL}"
-                mapped = True
-
-        # Add prefixes to non-mapped models if they match known lists
-        elif not mapped:
-            if clean_v in GEMINI_MODELS and not v.startswith('gemini/'):
-                new_model = f"gemini/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-            elif clean_v in OPENAI_MODELS and not v.startswith('openai/'):
-                new_model = f"openai/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-        # --- Mapping Logic --- END ---
-
-        if mapped:
-            logger.debug(f"📌 MODEL MAPPING: '{original_model}' ➡️ '{new_model}'")
-        else:
-             # If no mapping occurred and no prefix exists, log warning or decide default
-             if not v.startswith(('openai/', 'gemini/', 'anthropic/')):
-                 logger.warning(f"⚠️ No prefix or mapping rule for model: '{original_model}'. Using as is.")
-             new_model = v # Ensure we return the original if no rule applied
+        new_model = map_model_name(v)
 
         # Store the original model in the values dictionary
         values = info.data
@@ -249,69 +407,28 @@ class MessagesRequest(BaseModel):
         return new_model
 
 class TokenCountRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    # Declared before `model` so the value its validator stores is not reset to the default
+    original_model: Optional[str] = None  # Will store the original model name
     model: str
     messages: List[Message]
     system: Optional[Union[str, List[SystemContent]]] = None
-    tools: Optional[List[Tool]] = None
+    tools: List[Tool] = Field(default_factory=list)
     thinking: Optional[ThinkingConfig] = None
     tool_choice: Optional[Dict[str, Any]] = None
-    original_model: Optional[str] = None  # Will store the original model name
     
+    # Clients may send "tools": null; it is stored as an empty list so the proxy never
+    # has to check for None
+    @field_validator('tools', mode='before')
+    def tools_null_as_empty(cls, v):
+        return [] if v is None else v
+
     @field_validator('model')
     def validate_model_token_count(cls, v, info): # Renamed to avoid conflict
-        # Use the same logic as MessagesRequest validator
-        # NOTE: Pydantic validators might not share state easily if not class methods
-        # Re-implementing the logic here for clarity, could be refactored
+        # Use the same mapping as the MessagesRequest validator
         original_model = v
-        new_model = v # Default to original value
-
-        logger.debug(f"📋 TOKEN COUNT VALIDATION: Original='{original_model}', Preferred='{PREFERRED_PROVIDER}', BIG='{BIG_MODEL}', SMALL='{SMALL_MODEL}'")
-
-        # Remove provider prefixes for easier matching
-        clean_v = v
-        if clean_v.startswith('anthropic/'):
-            clean_v = clean_v[10:]
-        elif clean_v.startswith('openai/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('gemini/'):
-            clean_v = clean_v[7:]
-
-        # --- Mapping Logic --- START ---
-        mapped = False
-        # Map Haiku to SMALL_MODEL based on provider preference
-        if 'haiku' in clean_v.lower():
-            if PREFERRED_PROVIDER == "google" and SMALL_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{SMALL_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{SMALL_MODEL}"
-                mapped = True
-
-        # Map Sonnet to BIG_MODEL based on provider preference
-        elif 'sonnet' in clean_v.lower():
-            if PREFERRED_PROVIDER == "google" and BIG_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{BIG_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{BIG_MODEL}"
-                mapped = True
-
-        # Add prefixes to non-mapped models if they match known lists
-        elif not mapped:
-            if clean_v in GEMINI_MODELS and not v.startswith('gemini/'):
-                new_model = f"gemini/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-            elif clean_v in OPENAI_MODELS and not v.startswith('openai/'):
-                new_model = f"openai/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-        # --- Mapping Logic --- END ---
-
-        if mapped:
-            logger.debug(f"📌 TOKEN COUNT MAPPING: '{original_model}' ➡️ '{new_model}'")
-        else:
-             if not v.startswith(('openai/', 'gemini/', 'anthropic/')):
-                 logger.warning(f"⚠️ No prefix or mapping rule for token count model: '{original_model}'. Using as is.")
-             new_model = v # Ensure we return the original if no rule applied
+        new_model = map_model_name(v)
 
         # Store the original model in the values dictionary
         values = info.data
@@ -320,84 +437,119 @@ class TokenCountRequest(BaseModel):
 
         return new_model
 
-class TokenCountResponse(BaseModel):
-    input_tokens: int
+# Response models are built once per call, serialized and dropped, so they are frozen too
+RESPONSE_MODEL_CONFIG = ConfigDict(frozen=True)
 
 class Usage(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     input_tokens: int
     output_tokens: int
     cache_creation_input_tokens: int = 0
     cache_read_input_tokens: int = 0
 
 class MessagesResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     id: str
     model: str
     role: Literal["assistant"] = "assistant"
-    content: List[Union[ContentBlockText, ContentBlockToolUse]]
+    content: List[Annotated[Union[ContentBlockText, ContentBlockToolUse], Field(discriminator="type")]]
     type: Literal["message"] = "message"
     stop_reason: Optional[Literal["end_turn", "max_tokens", "stop_sequence", "tool_use"]] = None
     stop_sequence: Optional[str] = None
     usage: Usage
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    # Get request details
-    method = request.method
-    path = request.url.path
-    
-    # Log only basic request details at debug level
-    logger.debug(f"Request: {method} {path}")
-    
-    # Process the request and get the response
-    response = await call_next(request)
-    
-    return response
+# Logger methods the request middleware calls on every request
+logger_is_enabled_for = logger.isEnabledFor
+logger_debug = logger.debug
 
-# Not using validation function as we're using the environment API key
+class LogRequestsMiddleware:
+    """Pure ASGI middleware that logs each HTTP request at debug level.
 
-def parse_tool_result_content(content):
-    """Helper function to properly parse and normalize tool result content."""
-    if content is None:
-        return "No content provided"
-        
-    if isinstance(content, str):
-        return content
-        
-    if isinstance(content, list):
-        result = ""
-        for item in content:
-            if isinstance(item, dict) and item.get("type") == "text":
-                result += item.get("text", "") + "\n"
-            elif isinstance(item, str):
-                result += item + "\n"
-            elif isinstance(item, dict):
-                if "text" in item:
-                    result += item.get("text", "") + "\n"
-                else:
-                    try:
-                        result += json.dumps(item) + "\n"
-                    except:
-                        result += str(item) + "\n"
-            else:
-                try:
-                    result += str(item) + "\n"
-                except:
-                    result += "Unparseable content\n"
-        return result.strip()
-        
-    if isinstance(content, dict):
-        if content.get("type") == "text":
-            return content.get("text", "")
-        try:
-            return json.dumps(content)
-        except:
-            return str(content)
-            
-    # Fallback for any other type
+    Unlike @app.middleware("http") (Starlette's BaseHTTPMiddleware) it does not
+    wrap the request and response in extra streams and tasks, which matters for
+    long-lived SSE responses.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Log only basic request details at debug level
+        if scope["type"] == "http" and logger_is_enabled_for(logging.DEBUG):
+            logger_debug("Request: %s %s", scope["method"], scope["path"])
+        await self.app(scope, receive, send)
+
+app.add_middleware(LogRequestsMiddleware)
+
+def dumps_text(obj: Any) -> str:
+    """Serialize tool inputs and results that are passed on as text with orjson.
+
+    Non-string keys are accepted, as json.dumps did, and values orjson rejects go through json.
+    """
     try:
-        return str(content)
-    except:
-        return "Unparseable content"
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return json.dumps(obj)
+
+def convert_text_block(block: ContentBlockText) -> Dict[str, Any]:
+    """Convert a text block to its LiteLLM content part."""
+    return {"type": "text", "text": block.text}
+
+def convert_image_block(block: ContentBlockImage) -> Dict[str, Any]:
+    """Convert an image block to its LiteLLM content part."""
+    return {"type": "image", "source": block.source}
+
+def convert_tool_use_block(block: ContentBlockToolUse) -> Dict[str, Any]:
+    """Convert a tool_use block to its LiteLLM content part."""
+    return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+
+def convert_tool_result_block(block: ContentBlockToolResult) -> Dict[str, Any]:
+    """Convert a tool_result block, normalizing its content to a list of blocks."""
+    # Handle different formats of tool result content (parsed JSON, so exact types)
+    content_type = type(block.content)
+    if content_type is str:
+        # If it's a simple string, create a text block for it
+        content = [{"type": "text", "text": block.content}]
+    elif content_type is list:
+        # If it's already a list of blocks, keep it
+        content = block.content
+    else:
+        # Default fallback
+        content = [{"type": "text", "text": str(block.content)}]
+    return {"type": "tool_result", "tool_use_id": block.tool_use_id, "content": content}
+
+# Converter for each ContentBlock model, looked up by exact class
+CONTENT_BLOCK_CONVERTERS = MappingProxyType({
+    ContentBlockText: convert_text_block,
+    ContentBlockImage: convert_image_block,
+    ContentBlockToolUse: convert_tool_use_block,
+    ContentBlockToolResult: convert_tool_result_block,
+})
+
+# Anthropic tool_choice types that map to a fixed LiteLLM value (read-only)
+TOOL_CHOICE_MAP = MappingProxyType({
+    "auto": "auto",
+    "any": "any",
+})
+
+class ModelProfile(NamedTuple):
+    """Request settings that depend only on the LiteLLM model name."""
+    max_tokens_cap: Optional[int]
+    clean_gemini_schemas: bool  # Tool schemas need Gemini clean-up
+    flatten_content: bool  # Message content must be plain text
+
+# Request settings cached per model name
+@functools.lru_cache(maxsize=32)
+def litellm_model_profile(model: str) -> ModelProfile:
+    """Return the request settings specific to a LiteLLM model name."""
+    # OpenAI and Gemini models are capped at 16384 output tokens
+    max_tokens_cap = 16384 if model.startswith(("openai/", "gemini/")) else None
+    return ModelProfile(
+        max_tokens_cap=max_tokens_cap,
+        clean_gemini_schemas=model.startswith("gemini/"),
+        flatten_content="openai" in model,
+    )
 
 def convert_anthropic_to_litellm(anthropic_request: MessagesRequest) -> Dict[str, Any]:
     """Convert Anthropic API request format to LiteLLM format (which follows OpenAI)."""
@@ -413,178 +565,149 @@ def convert_anthropic_to_litellm(anthropic_request: MessagesRequest) -> Dict[str
             # Simple string format
             messages.append({"role": "system", "content": anthropic_request.system})
         elif isinstance(anthropic_request.system, list):
-            # List of content blocks
-            system_text = ""
-            for block in anthropic_request.system:
-                if hasattr(block, 'type') and block.type == "text":
-                    system_text += block.text + "\n\n"
-                elif isinstance(block, dict) and block.get("type") == "text":
-                    system_text += block.get("text", "") + "\n\n"
-            
-            if system_text:
-                messages.append({"role": "system", "content": system_text.strip()})
+            # List of text blocks (SystemContent only allows text); single block used as-is
+            system_blocks = anthropic_request.system
+            if len(system_blocks) == 1:
+                system_text = system_blocks[0].text
+            else:
+                system_text = "\n\n".join([block.text for block in system_blocks])
+            messages.append({"role": "system", "content": system_text.strip()})
+    
+    # Plain chat traffic often has nothing but string content, which passes through as-is,
+    # so that shape is converted in one comprehension without the per-block handling below
+    if all(type(msg.content) is str for msg in anthropic_request.messages):
+        messages += [{"role": msg.role, "content": msg.content} for msg in anthropic_request.messages]
+        conversation = ()
+    else:
+        conversation = anthropic_request.messages
     
-    # Add conversation messages
-    for idx, msg in enumerate(anthropic_request.messages):
+    # Add conversation messages, one LiteLLM message per conversation message
+    for msg in conversation:
         content = msg.content
         if isinstance(content, str):
             messages.append({"role": msg.role, "content": content})
+        elif len(content) == 1 and type(content[0]) is ContentBlockText and content[0].text and content[0].text == content[0].text.strip():
+            # A lone text block says the same as plain string content, which every provider
+            # takes as-is, so skip building (and for OpenAI, later flattening) a block list.
+            # Only text without surrounding whitespace takes this path: the OpenAI flattening
+            # strips text and replaces empty results with "...", and that would make a difference
+            messages.append({"role": msg.role, "content": content[0].text})
         else:
             # Special handling for tool_result in user messages
             # OpenAI/LiteLLM format expects the assistant to call the tool, 
             # and the user's next message to include the result as plain text
-            if msg.role == "user" and any(block.type == "tool_result" for block in content if hasattr(block, "type")):
-                # For user messages with tool_result, split into separate messages
-                text_content = ""
+            if msg.role == "user" and any(block.type == "tool_result" for block in content):
+                # For user messages with tool_result, everything becomes one plain-text user
+                # message, built from one list of pieces joined once
+                parts = []
+                add_part = parts.append
                 
-                # Extract all text parts and concatenate them
+                # Every block is a validated ContentBlock model
                 for block in content:
-                    if hasattr(block, "type"):
-                        if block.type == "text":
-                            text_content += block.text + "\n"
-                        elif block.type == "tool_result":
-                            # Add tool result as a message by itself - simulate the normal flow
-                            tool_id = block.tool_use_id if hasattr(block, "tool_use_id") else ""
-                            
-                            # Handle different formats of tool result content
-                            result_content = ""
-                            if hasattr(block, "content"):
-                                if isinstance(block.content, str):
-                                    result_content = block.content
-                                elif isinstance(block.content, list):
-                                    # If content is a list of blocks, extract text from each
-                                    for content_block in block.content:
-                                        if hasattr(content_block, "type") and content_block.type == "text":
-                                            result_content += content_block.text + "\n"
-                                        elif isinstance(content_block, dict) and content_block.get("type") == "text":
-                                            result_content += content_block.get("text", "") + "\n"
-                                        elif isinstance(content_block, dict):
-                                            # Handle any dict by trying to extract text or convert to JSON
-                                            if "text" in content_block:
-                                                result_content += content_block.get("text", "") + "\n"
-                                            else:
-                                                try:
-                                                    result_content += json.dumps(content_block) + "\n"
-                                                except:
-                                                    result_content += str(content_block) + "\n"
-                                elif isinstance(block.content, dict):
-                                    # Handle dictionary content
-                                    if block.content.get("type") == "text":
-                                        result_content = block.content.get("text", "")
-                                    else:
-                                        try:
-                                            result_content = json.dumps(block.content)
-                                        except:
-                                            result_content = str(block.content)
+                    if block.type == "text":
+                        add_part(block.text)
+                        add_part("\n")
+                    elif block.type == "tool_result":
+                        # In OpenAI format, tool results come from the user (rather than being content blocks)
+                        add_part(f"Tool result for {block.tool_use_id}:\n")
+                        
+                        # Handle different formats of tool result content; it comes from
+                        # parsed JSON, so its exact type is checked once, strings (the usual
+                        # case) first and passed through without serializing
+                        result_content = block.content
+                        result_type = type(result_content)
+                        if result_type is str:
+                            add_part(result_content)
+                        elif result_type is list:
+                            # If content is a list of blocks, extract text from each
+                            # (items are parsed JSON too; only dicts carry text)
+                            for content_block in result_content:
+                                if type(content_block) is not dict:
+                                    continue
+                                # Text blocks and any other dict with text give their text
+                                if content_block.get("type") == "text" or "text" in content_block:
+                                    add_part(content_block.get("text", "") + "\n")
                                 else:
-                                    # Handle any other type by converting to string
+                                    # Otherwise convert the dict to JSON
                                     try:
-                                        result_content = str(block.content)
+                                        add_part(dumps_text(content_block) + "\n")
                                     except:
-                                        result_content = "Unparseable content"
-                            
-                            # In OpenAI format, tool results come from the user (rather than being content blocks)
-                            text_content += f"Tool result for {tool_id}:\n{result_content}\n"
+                                        add_part(str(content_block) + "\n")
+                        elif result_type is dict:
+                            # Handle dictionary content
+                            if result_content.get("type") == "text":
+                                add_part(str(result_content.get("text", "")))
+                            else:
+                                try:
+                                    add_part(dumps_text(result_content))
+                                except:
+                                    add_part(str(result_content))
+                        else:
+                            # Handle any other type by converting to string
+                            try:
+                                add_part(str(result_content))
+                            except:
+                                add_part("Unparseable content")
+                        add_part("\n")
                 
                 # Add as a single user message with all the content
-                messages.append({"role": "user", "content": text_content.strip()})
+                messages.append({"role": "user", "content": "".join(parts).strip()})
             else:
                 # Regular handling for other message types
-                processed_content = []
-                for block in content:
-                    if hasattr(block, "type"):
-                        if block.type == "text":
-                            processed_content.append({"type": "text", "text": block.text})
-                        elif block.type == "image":
-                            processed_content.append({"type": "image", "source": block.source})
-                        elif block.type == "tool_use":
-                            # Handle tool use blocks if needed
-                            processed_content.append({
-                                "type": "tool_use",
-                                "id": block.id,
-                                "name": block.name,
-                                "input": block.input
-                            })
-                        elif block.type == "tool_result":
-                            # Handle different formats of tool result content
-                            processed_content_block = {
-                                "type": "tool_result",
-                                "tool_use_id": block.tool_use_id if hasattr(block, "tool_use_id") else ""
-                            }
-                            
-                            # Process the content field properly
-                            if hasattr(block, "content"):
-                                if isinstance(block.content, str):
-                                    # If it's a simple string, create a text block for it
-                                    processed_content_block["content"] = [{"type": "text", "text": block.content}]
-                                elif isinstance(block.content, list):
-                                    # If it's already a list of blocks, keep it
-                                    processed_content_block["content"] = block.content
-                                else:
-                                    # Default fallback
-                                    processed_content_block["content"] = [{"type": "text", "text": str(block.content)}]
-                            else:
-                                # Default empty content
-                                processed_content_block["content"] = [{"type": "text", "text": ""}]
-                                
-                            processed_content.append(processed_content_block)
-                
-                messages.append({"role": msg.role, "content": processed_content})
+                messages.append({
+                    "role": msg.role,
+                    "content": [CONTENT_BLOCK_CONVERTERS[type(block)](block) for block in content]
+                })
+    
+    model_profile = litellm_model_profile(anthropic_request.model)
+    max_tokens_cap = model_profile.max_tokens_cap
     
     # Cap max_tokens for OpenAI models to their limit of 16384
     max_tokens = anthropic_request.max_tokens
-    if anthropic_request.model.startswith("openai/") or anthropic_request.model.startswith("gemini/"):
-        max_tokens = min(max_tokens, 16384)
-        logger.debug(f"Capping max_tokens to 16384 for OpenAI/Gemini model (original value: {anthropic_request.max_tokens})")
+    if max_tokens_cap is not None:
+        max_tokens = min(max_tokens, max_tokens_cap)
+        logger.debug("Capping max_tokens to %s for OpenAI/Gemini model (original value: %s)", max_tokens_cap, anthropic_request.max_tokens)
     
     # Create LiteLLM request dict
     litellm_request = {
         "model": anthropic_request.model,  # t understands "anthropic/claude-x" format
         "messages": messages,
         "max_tokens": max_tokens,
-        "temperature": anthropic_request.temperature,
         "stream": anthropic_request.stream,
     }
     
-    # Add optional parameters if present
+    # Add optional parameters if present; keys are only written when set, so the dict
+    # never needs a pass to drop unset values before it goes to LiteLLM
+    if anthropic_request.temperature is not None:
+        litellm_request["temperature"] = anthropic_request.temperature
+    
     if anthropic_request.stop_sequences:
         litellm_request["stop"] = anthropic_request.stop_sequences
     
-    if anthropic_request.top_p:
+    # Sampling parameters are only dropped when unset, so an explicit 0 is passed on
+    if anthropic_request.top_p is not None:
         litellm_request["top_p"] = anthropic_request.top_p
     
-    if anthropic_request.top_k:
+    if anthropic_request.top_k is not None:
         litellm_request["top_k"] = anthropic_request.top_k
     
     # Convert tools to OpenAI format
     if anthropic_request.tools:
         openai_tools = []
-        is_gemini_model = anthropic_request.model.startswith("gemini/")
 
         for tool in anthropic_request.tools:
-            # Convert to dict if it's a pydantic model
-            if hasattr(tool, 'dict'):
-                tool_dict = tool.dict()
-            else:
-                # Ensure tool_dict is a dictionary, handle potential errors if 'tool' isn't dict-like
-                try:
-                    tool_dict = dict(tool) if not isinstance(tool, dict) else tool
-                except (TypeError, ValueError):
-                     logger.error(f"Could not convert tool to dict: {tool}")
-                     continue # Skip this tool if conversion fails
-
-            # Clean the schema if targeting a Gemini model
-            input_schema = tool_dict.get("input_schema", {})
-            if is_gemini_model:
-                 logger.debug(f"Cleaning schema for Gemini tool: {tool_dict.get('name')}")
+            # clean_gemini_schema returns a copy, so the request's schema is never mutated
+            input_schema = tool.input_schema
+            if model_profile.clean_gemini_schemas:
+                 logger.debug("Cleaning schema for Gemini tool: %s", tool.name)
                  input_schema = clean_gemini_schema(input_schema)
 
             # Create OpenAI-compatible function tool
             openai_tool = {
                 "type": "function",
                 "function": {
-                    "name": tool_dict["name"],
-                    "description": tool_dict.get("description", ""),
+                    "name": tool.name,
+                    "description": tool.description,
                     "parameters": input_schema # Use potentially cleaned schema
                 }
             }
@@ -594,28 +717,65 @@ def convert_anthropic_to_litellm(anthropic_request: MessagesRequest) -> Dict[str
     
     # Convert tool_choice to OpenAI format if present
     if anthropic_request.tool_choice:
-        if hasattr(anthropic_request.tool_choice, 'dict'):
-            tool_choice_dict = anthropic_request.tool_choice.dict()
-        else:
-            tool_choice_dict = anthropic_request.tool_choice
-            
+        tool_choice = anthropic_request.tool_choice
+        
         # Handle Anthropic's tool_choice format
-        choice_type = tool_choice_dict.get("type")
-        if choice_type == "auto":
-            litellm_request["tool_choice"] = "auto"
-        elif choice_type == "any":
-            litellm_request["tool_choice"] = "any"
-        elif choice_type == "tool" and "name" in tool_choice_dict:
+        choice_type = tool_choice.get("type")
+        if choice_type == "tool" and "name" in tool_choice:
             litellm_request["tool_choice"] = {
                 "type": "function",
-                "function": {"name": tool_choice_dict["name"]}
+                "function": {"name": tool_choice["name"]}
             }
         else:
             # Default to auto if we can't determine
-            litellm_request["tool_choice"] = "auto"
+            litellm_request["tool_choice"] = TOOL_CHOICE_MAP.get(choice_type, "auto")
     
     return litellm_request
 
+# OpenAI finish_reason -> Anthropic stop_reason; anything unknown maps to end_turn (read-only)
+STOP_REASON_MAP = MappingProxyType({
+    "stop": "end_turn",
+    "length": "max_tokens",
+    "tool_calls": "tool_use",
+})
+
+# orjson parses integers beyond 64 bits as floats, so arguments with 19+ digit runs use json
+LONG_DIGIT_RUN = re.compile(r"\d{19}")
+
+def loads_arguments(arguments: str) -> Any:
+    """Parse tool-call arguments with orjson, using json where orjson rejects or rounds values.
+
+    json accepts NaN/Infinity and keeps big integers exact; both raise json.JSONDecodeError
+    on invalid input.
+    """
+    if LONG_DIGIT_RUN.search(arguments) is None:
+        try:
+            return orjson.loads(arguments)
+        except json.JSONDecodeError:
+            pass
+    return json.loads(arguments)
+
+def dumps_indented(obj: Any) -> str:
+    """Pretty-print tool arguments shown as text the way json.dumps(indent=2) did.
+
+    Values orjson rejects, such as integers beyond 64 bits or lone surrogates, go through json.
+    """
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return json.dumps(obj, indent=2)
+
+def tool_call_fields(tool_call: Any) -> Tuple[Optional[str], str, Any]:
+    """Return the id, function name and arguments of a tool call given as a dict or object."""
+    # Extract function data based on whether it's a dict or object
+    if isinstance(tool_call, dict):
+        function = tool_call.get("function", {})
+        return tool_call.get("id"), function.get("name", ""), function.get("arguments", "{}")
+    function = getattr(tool_call, "function", None)
+    if not function:
+        return getattr(tool_call, "id", None), "", "{}"
+    return getattr(tool_call, "id", None), getattr(function, "name", ""), getattr(function, "arguments", "{}")
+
 def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any], 
                                  original_request: MessagesRequest) -> MessagesResponse:
     """Convert LiteLLM (OpenAI format) response to Anthropic API response format."""
@@ -641,7 +801,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
             tool_calls = message.tool_calls if message and hasattr(message, 'tool_calls') else None
             finish_reason = choices[0].finish_reason if choices and len(choices) > 0 else "stop"
             usage_info = litellm_response.usage
-            response_id = getattr(litellm_response, 'id', f"msg_{uuid.uuid4()}")
+            response_id = getattr(litellm_response, 'id', None) or f"msg_{uuid.uuid4()}"
         else:
             # For backward compatibility - handle dict responses
             # If response is a dict, use it, otherwise try to convert to dict
@@ -654,7 +814,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 except AttributeError:
                     # Fallback - manually extract attributes
                     response_dict = {
-                        "id": getattr(litellm_response, 'id', f"msg_{uuid.uuid4()}"),
+                        "id": getattr(litellm_response, 'id', None) or f"msg_{uuid.uuid4()}",
                         "choices": getattr(litellm_response, 'choices', [{}]),
                         "usage": getattr(litellm_response, 'usage', {})
                     }
@@ -666,7 +826,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
             tool_calls = message.get("tool_calls", None)
             finish_reason = choices[0].get("finish_reason", "stop") if choices and len(choices) > 0 else "stop"
             usage_info = response_dict.get("usage", {})
-            response_id = response_dict.get("id", f"msg_{uuid.uuid4()}")
+            response_id = response_dict.get("id") or f"msg_{uuid.uuid4()}"
         
         # Create content list for Anthropic format
         content = []
@@ -677,36 +837,27 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
         
         # Add tool calls if present (tool_use in Anthropic format) - only for Claude models
         if tool_calls and is_claude_model:
-            logger.debug(f"Processing tool calls: {tool_calls}")
+            logger.debug("Processing tool calls: %s", tool_calls)
             
             # Convert to list if it's not already
             if not isinstance(tool_calls, list):
                 tool_calls = [tool_calls]
                 
             for idx, tool_call in enumerate(tool_calls):
-                logger.debug(f"Processing tool call {idx}: {tool_call}")
+                logger.debug("Processing tool call %s: %s", idx, tool_call)
                 
-                # Extract function data based on whether it's a dict or object
-                if isinstance(tool_call, dict):
-                    function = tool_call.get("function", {})
-                    tool_id = tool_call.get("id", f"tool_{uuid.uuid4()}")
-                    name = function.get("name", "")
-                    arguments = function.get("arguments", "{}")
-                else:
-                    function = getattr(tool_call, "function", None)
-                    tool_id = getattr(tool_call, "id", f"tool_{uuid.uuid4()}")
-                    name = getattr(function, "name", "") if function else ""
-                    arguments = getattr(function, "arguments", "{}") if function else "{}"
+                tool_id, name, arguments = tool_call_fields(tool_call)
+                tool_id = tool_id or f"tool_{uuid.uuid4()}"
                 
                 # Convert string arguments to dict if needed
                 if isinstance(arguments, str):
                     try:
-                        arguments = json.loads(arguments)
+                        arguments = loads_arguments(arguments)
                     except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse tool arguments as JSON: {arguments}")
+                        logger.warning("Failed to parse tool arguments as JSON: %s", arguments)
                         arguments = {"raw": arguments}
                 
-                logger.debug(f"Adding tool_use block: id={tool_id}, name={name}, input={arguments}")
+                logger.debug("Adding tool_use block: id=%s, name=%s, input=%s", tool_id, name, arguments)
                 
                 content.append({
                     "type": "tool_use",
@@ -716,7 +867,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 })
         elif tool_calls and not is_claude_model:
             # For non-Claude models, convert tool calls to text format
-            logger.debug(f"Converting tool calls to text for non-Claude model: {clean_model}")
+            logger.debug("Converting tool calls to text for non-Claude model: %s", clean_model)
             
             # We'll append tool info to the text content
             tool_text = "\n\nTool usage:\n"
@@ -726,27 +877,17 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 tool_calls = [tool_calls]
                 
             for idx, tool_call in enumerate(tool_calls):
-                # Extract function data based on whether it's a dict or object
-                if isinstance(tool_call, dict):
-                    function = tool_call.get("function", {})
-                    tool_id = tool_call.get("id", f"tool_{uuid.uuid4()}")
-                    name = function.get("name", "")
-                    arguments = function.get("arguments", "{}")
-                else:
-                    function = getattr(tool_call, "function", None)
-                    tool_id = getattr(tool_call, "id", f"tool_{uuid.uuid4()}")
-                    name = getattr(function, "name", "") if function else ""
-                    arguments = getattr(function, "arguments", "{}") if function else "{}"
+                _, name, arguments = tool_call_fields(tool_call)
                 
                 # Convert string arguments to dict if needed
                 if isinstance(arguments, str):
                     try:
-                        args_dict = json.loads(arguments)
-                        arguments_str = json.dumps(args_dict, indent=2)
+                        args_dict = loads_arguments(arguments)
+                        arguments_str = dumps_indented(args_dict)
                     except json.JSONDecodeError:
                         arguments_str = arguments
                 else:
-                    arguments_str = json.dumps(arguments, indent=2)
+                    arguments_str = dumps_indented(arguments)
                 
                 tool_text += f"Tool: {name}\nArguments: {arguments_str}\n\n"
             
@@ -765,88 +906,154 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
             completion_tokens = getattr(usage_info, "completion_tokens", 0)
         
         # Map OpenAI finish_reason to Anthropic stop_reason
-        stop_reason = None
-        if finish_reason == "stop":
-            stop_reason = "end_turn"
-        elif finish_reason == "length":
-            stop_reason = "max_tokens"
-        elif finish_reason == "tool_calls":
-            stop_reason = "tool_use"
-        else:
-            stop_reason = "end_turn"  # Default
+        stop_reason = STOP_REASON_MAP.get(finish_reason, "end_turn")
         
         # Make sure content is never empty
         if not content:
             content.append({"type": "text", "text": ""})
         
-        # Create Anthropic-style response
-        anthropic_response = MessagesResponse(
+        # Create Anthropic-style response. Every field was just built here from the
+        # LiteLLM response, so use model_construct to skip a second validation pass
+        content_blocks = [
+            ContentBlockToolUse.model_construct(**block) if block["type"] == "tool_use"
+            else ContentBlockText.model_construct(**block)
+            for block in content
+        ]
+        anthropic_response = MessagesResponse.model_construct(
             id=response_id,
             model=original_request.model,
             role="assistant",
-            content=content,
+            content=content_blocks,
             stop_reason=stop_reason,
             stop_sequence=None,
-            usage=Usage(
+            usage=Usage.model_construct(
                 input_tokens=prompt_tokens,
                 output_tokens=completion_tokens
             )
         )
         
+        if STRICT_RESPONSE_VALIDATION:
+            anthropic_response = MessagesResponse.model_validate(anthropic_response.model_dump())
+        
         return anthropic_response
         
     except Exception as e:
-        import traceback
         error_traceback = traceback.format_exc()
         error_message = f"Error converting response: {str(e)}\n\nFull traceback:\n{error_traceback}"
         logger.error(error_message)
         
-        # In case of any error, create a fallback response
-        return MessagesResponse(
+        # In case of any error, create a fallback response; its fields are fixed or plain
+        # strings, so it is constructed without validation like the regular response
+        return MessagesResponse.model_construct(
             id=f"msg_{uuid.uuid4()}",
             model=original_request.model,
             role="assistant",
-            content=[{"type": "text", "text": f"Error converting response: {str(e)}. Please check server logs."}],
+            content=[ContentBlockText.model_construct(type="text", text=f"Error converting response: {str(e)}. Please check server logs.")],
             stop_reason="end_turn",
-            usage=Usage(input_tokens=0, output_tokens=0)
+            usage=Usage.model_construct(input_tokens=0, output_tokens=0)
         )
 
-async def handle_streaming(response_generator, original_request: MessagesRequest):
-    """Handle streaming responses from LiteLLM and convert to Anthropic format."""
+# Each SSE frame is its event line and data prefix, the JSON payload, and a blank line
+MESSAGE_START_PREFIX = b"event: message_start\ndata: "
+CONTENT_BLOCK_START_PREFIX = b"event: content_block_start\ndata: "
+PING_PREFIX = b"event: ping\ndata: "
+CONTENT_BLOCK_DELTA_PREFIX = b"event: content_block_delta\ndata: "
+CONTENT_BLOCK_STOP_PREFIX = b"event: content_block_stop\ndata: "
+MESSAGE_DELTA_PREFIX = b"event: message_delta\ndata: "
+MESSAGE_STOP_PREFIX = b"event: message_stop\ndata: "
+SSE_EVENT_END = b"\n\n"
+
+def dumps_event_json(obj: Any) -> bytes:
+    """Encode a variable part of an event with orjson, falling back to json for what orjson rejects.
+
+    Upstream text and tool arguments may hold lone surrogates or integers beyond 64 bits,
+    which json.dumps encodes (ASCII-escaped) but orjson.dumps raises on.
+    """
     try:
-        # Send message_start event
-        message_id = f"msg_{uuid.uuid4().hex[:24]}"  # Format similar to Anthropic's IDs
-        
-        message_data = {
-            'type': 'message_start',
-            'message': {
-                'id': message_id,
-                'type': 'message',
-                'role': 'assistant',
-                'model': original_request.model,
-                'content': [],
-                'stop_reason': None,
-                'stop_sequence': None,
-                'usage': {
-                    'input_tokens': 0,
-                    'cache_creation_input_tokens': 0,
-                    'cache_read_input_tokens': 0,
-                    'output_tokens': 0
-                }
+        return orjson.dumps(obj)
+    except TypeError:
+        return json.dumps(obj).encode()
+
+# SSE events without a variable payload never change, so serialize them once at import
+TEXT_BLOCK_START_EVENT = CONTENT_BLOCK_START_PREFIX + orjson.dumps({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}}) + SSE_EVENT_END
+TEXT_BLOCK_STOP_EVENT = CONTENT_BLOCK_STOP_PREFIX + orjson.dumps({'type': 'content_block_stop', 'index': 0}) + SSE_EVENT_END
+PING_EVENT = PING_PREFIX + orjson.dumps({'type': 'ping'}) + SSE_EVENT_END
+MESSAGE_STOP_EVENT = MESSAGE_STOP_PREFIX + orjson.dumps({'type': 'message_stop'}) + SSE_EVENT_END
+# Every stream ends with message_stop followed by the [DONE] marker (matching Anthropic's behavior)
+STREAM_END_EVENTS = MESSAGE_STOP_EVENT + b"data: [DONE]\n\n"
+
+# The events closing a failed stream
+STREAM_ERROR_EVENTS = (
+    MESSAGE_DELTA_PREFIX + orjson.dumps({'type': 'message_delta', 'delta': {'stop_reason': 'error', 'stop_sequence': None}, 'usage': {'output_tokens': 0}}) + SSE_EVENT_END
+    + STREAM_END_EVENTS
+)
+
+# Delta events only vary in their text, so they are spliced between pre-serialized halves
+# and just the text goes through orjson (which escapes a bare string the same way)
+TEXT_DELTA_PREFIX, TEXT_DELTA_SUFFIX = (CONTENT_BLOCK_DELTA_PREFIX + orjson.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': '__TEXT__'}}) + SSE_EVENT_END).split(b'"__TEXT__"')
+
+# message_delta only varies in the output token count for a given stop reason, so keep
+# its serialized halves for every stop reason a stream can end with
+MESSAGE_DELTA_EVENT_PARTS = MappingProxyType({
+    stop_reason: (MESSAGE_DELTA_PREFIX + orjson.dumps({'type': 'message_delta', 'delta': {'stop_reason': stop_reason, 'stop_sequence': None}, 'usage': {'output_tokens': '__TOKENS__'}}) + SSE_EVENT_END).split(b'"__TOKENS__"')
+    for stop_reason in ("end_turn", *STOP_REASON_MAP.values())
+})
+
+# Block indexes are small integers that repeat in every stream with tool calls
+@functools.lru_cache(maxsize=64)
+def content_block_stop_event(index: int) -> bytes:
+    """Encode the content_block_stop event for a block index."""
+    return CONTENT_BLOCK_STOP_PREFIX + orjson.dumps({'type': 'content_block_stop', 'index': index}) + SSE_EVENT_END
+
+@functools.lru_cache(maxsize=64)
+def tool_block_stop_events(last_index: int) -> bytes:
+    """Encode the content_block_stop events closing tool blocks 1..last_index as one chunk."""
+    return b"".join(content_block_stop_event(i) for i in range(1, last_index + 1))
+
+def json_delta_event_parts(index: int) -> List[bytes]:
+    """Split an input_json_delta event for the given block index around its partial_json."""
+    return (CONTENT_BLOCK_DELTA_PREFIX + orjson.dumps({'type': 'content_block_delta', 'index': index, 'delta': {'type': 'input_json_delta', 'partial_json': '__JSON__'}}) + SSE_EVENT_END).split(b'"__JSON__"')
+
+# Encoded stream opening (message_start, first content_block_start, ping) per model, split around the message id
+@functools.lru_cache(maxsize=32)
+def stream_opening_parts(model: str) -> List[bytes]:
+    """Split the opening events of a stream for a model around its message id."""
+    message_data = {
+        'type': 'message_start',
+        'message': {
+            'id': '__ID__',
+            'type': 'message',
+            'role': 'assistant',
+            'model': model,
+            'content': [],
+            'stop_reason': None,
+            'stop_sequence': None,
+            'usage': {
+                'input_tokens': 0,
+                'cache_creation_input_tokens': 0,
+                'cache_read_input_tokens': 0,
+                'output_tokens': 0
             }
         }
-        yield f"event: message_start\ndata: {json.dumps(message_data)}\n\n"
-        
-        # Content block index for the first text block
-        yield f"event: content_block_start\ndata: {json.dumps({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})}\n\n"
+    }
+    prefix, suffix = (MESSAGE_START_PREFIX + orjson.dumps(message_data) + SSE_EVENT_END).split(b'"__ID__"')
+    return [prefix, suffix + TEXT_BLOCK_START_EVENT + PING_EVENT]
+
+async def handle_streaming(response_generator, original_request: MessagesRequest) -> AsyncGenerator[bytes, None]:
+    """Handle streaming responses from LiteLLM and convert to Anthropic format.
+
+    Events are yielded already UTF-8 encoded, so the response does not re-encode each one.
+    """
+    try:
+        # Send message_start event
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"  # Format similar to Anthropic's IDs
+        opening_prefix, opening_suffix = stream_opening_parts(original_request.model)
         
-        # Send a ping to keep the connection alive (Anthropic does this)
-        yield f"event: ping\ndata: {json.dumps({'type': 'ping'})}\n\n"
+        # message_start, content_block_start and ping always go out together in one write
+        yield opening_prefix + f'"{message_id}"'.encode() + opening_suffix
         
         tool_index = None
-        current_tool_call = None
-        tool_content = ""
-        accumulated_text = ""  # Track accumulated text content
+        accumulated_text = ""  # Track text held back before any has been streamed
         text_sent = False  # Track if we've sent any text content
         text_block_closed = False  # Track if text block is closed
         input_tokens = 0
@@ -854,21 +1061,52 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
         has_sent_stop_reason = False
         last_tool_index = 0
         
+        # Halves of the input_json_delta event for the current tool block
+        json_delta_prefix = json_delta_suffix = b""
+        
+        # Events produced by one upstream chunk are collected here and sent together,
+        # so a chunk that closes blocks and ends the message costs one write, not five
+        events = []
+        # Bound once, since it is called for nearly every event of every chunk
+        emit_event = events.append
+        
+        def close_stream(stop_reason: str) -> None:
+            """Queue the events that close open blocks and end the message."""
+            # Close any open tool call blocks
+            if tool_index is not None:
+                emit_event(tool_block_stop_events(last_tool_index))
+            
+            # If we accumulated text but never sent or closed text block, do it now
+            if not text_block_closed:
+                if accumulated_text and not text_sent:
+                    # Send the accumulated text
+                    emit_event(TEXT_DELTA_PREFIX + dumps_event_json(accumulated_text) + TEXT_DELTA_SUFFIX)
+                # Close the text block
+                emit_event(TEXT_BLOCK_STOP_EVENT)
+            
+            # Send message_delta with stop reason and usage
+            message_delta_prefix, message_delta_suffix = MESSAGE_DELTA_EVENT_PARTS[stop_reason]
+            emit_event(message_delta_prefix + orjson.dumps(output_tokens) + message_delta_suffix)
+            
+            # Send message_stop event and the final [DONE] marker
+            emit_event(STREAM_END_EVENTS)
+        
         # Process each chunk
         async for chunk in response_generator:
             try:
 
                 
-                # Check if this is the end of the response with usage data
-                if hasattr(chunk, 'usage') and chunk.usage is not None:
-                    if hasattr(chunk.usage, 'prompt_tokens'):
-                        input_tokens = chunk.usage.prompt_tokens
-                    if hasattr(chunk.usage, 'completion_tokens'):
-                        output_tokens = chunk.usage.completion_tokens
+                # Check if this is the end of the response with usage data; a single
+                # getattr with a default replaces each hasattr check and the read after it
+                usage = getattr(chunk, 'usage', None)
+                if usage is not None:
+                    input_tokens = getattr(usage, 'prompt_tokens', input_tokens)
+                    output_tokens = getattr(usage, 'completion_tokens', output_tokens)
                 
                 # Handle text content
-                if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-                    choice = chunk.choices[0]
+                choices = getattr(chunk, 'choices', None)
+                if choices:
+                    choice = choices[0]
                     
                     # Get the delta from the choice
                     if hasattr(choice, 'delta'):
@@ -889,14 +1127,16 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                     elif isinstance(delta, dict) and 'content' in delta:
                         delta_content = delta['content']
                     
-                    # Accumulate text content
+                    # Forward text content
                     if delta_content is not None and delta_content != "":
-                        accumulated_text += delta_content
-                        
                         # Always emit text deltas if no tool calls started
                         if tool_index is None and not text_block_closed:
                             text_sent = True
-                            yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': delta_content}})}\n\n"
+                            emit_event(TEXT_DELTA_PREFIX + dumps_event_json(delta_content) + TEXT_DELTA_SUFFIX)
+                        # Accumulated text is only read while nothing has been streamed yet,
+                        # so the common streaming path does not grow a copy of the reply
+                        elif not text_sent:
+                            accumulated_text += delta_content
                     
                     # Process tool calls
                     delta_tool_calls = None
@@ -914,20 +1154,20 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                             # If we've been streaming text, close that text block
                             if text_sent and not text_block_closed:
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                emit_event(TEXT_BLOCK_STOP_EVENT)
                             # If we've accumulated text but not sent it, we need to emit it now
                             # This handles the case where the first delta has both text and a tool call
                             elif accumulated_text and not text_sent and not text_block_closed:
                                 # Send the accumulated text
                                 text_sent = True
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': accumulated_text}})}\n\n"
+                                emit_event(TEXT_DELTA_PREFIX + dumps_event_json(accumulated_text) + TEXT_DELTA_SUFFIX)
                                 # Close the text block
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                emit_event(TEXT_BLOCK_STOP_EVENT)
                             # Close text block even if we haven't sent anything - models sometimes emit empty text blocks
                             elif not text_block_closed:
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                emit_event(TEXT_BLOCK_STOP_EVENT)
                                 
                         # Convert to list if it's not already
                         if not isinstance(delta_tool_calls, list):
@@ -954,16 +1194,15 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                                 if isinstance(tool_call, dict):
                                     function = tool_call.get('function', {})
                                     name = function.get('name', '') if isinstance(function, dict) else ""
-                                    tool_id = tool_call.get('id', f"toolu_{uuid.uuid4().hex[:24]}")
+                                    tool_id = tool_call.get('id') or f"toolu_{uuid.uuid4().hex[:24]}"
                                 else:
                                     function = getattr(tool_call, 'function', None)
                                     name = getattr(function, 'name', '') if function else ''
-                                    tool_id = getattr(tool_call, 'id', f"toolu_{uuid.uuid4().hex[:24]}")
+                                    tool_id = getattr(tool_call, 'id', None) or f"toolu_{uuid.uuid4().hex[:24]}"
                                 
                                 # Start a new tool_use block
-                                yield f"event: content_block_start\ndata: {json.dumps({'type': 'content_block_start', 'index': anthropic_tool_index, 'content_block': {'type': 'tool_use', 'id': tool_id, 'name': name, 'input': {}}})}\n\n"
-                                current_tool_call = tool_call
-                                tool_content = ""
+                                emit_event(CONTENT_BLOCK_START_PREFIX + dumps_event_json({'type': 'content_block_start', 'index': anthropic_tool_index, 'content_block': {'type': 'tool_use', 'id': tool_id, 'name': name, 'input': {}}}) + SSE_EVENT_END)
+                                json_delta_prefix, json_delta_suffix = json_delta_event_parts(anthropic_tool_index)
                             
                             # Extract function arguments
                             arguments = None
@@ -976,343 +1215,392 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                             
                             # If we have arguments, send them as a delta
                             if arguments:
-                                # Try to detect if arguments are valid JSON or just a fragment
-                                try:
-                                    # If it's already a dict, use it
-                                    if isinstance(arguments, dict):
-                                        args_json = json.dumps(arguments)
-                                    else:
-                                        # Otherwise, try to parse it
-                                        json.loads(arguments)
-                                        args_json = arguments
-                                except (json.JSONDecodeError, TypeError):
-                                    # If it's a fragment, treat it as a string
+                                # Dicts are serialized; strings (complete JSON or a fragment) are
+                                # forwarded as-is, so there is no need to parse them first
+                                if isinstance(arguments, dict):
+                                    args_json = dumps_event_json(arguments).decode()
+                                else:
                                     args_json = arguments
                                 
-                                # Add to accumulated tool content
-                                tool_content += args_json if isinstance(args_json, str) else ""
-                                
                                 # Send the update
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': anthropic_tool_index, 'delta': {'type': 'input_json_delta', 'partial_json': args_json}})}\n\n"
+                                emit_event(json_delta_prefix + dumps_event_json(args_json) + json_delta_suffix)
                     
                     # Process finish_reason - end the streaming response
                     if finish_reason and not has_sent_stop_reason:
                         has_sent_stop_reason = True
-                        
-                        # Close any open tool call blocks
-                        if tool_index is not None:
-                            for i in range(1, last_tool_index + 1):
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': i})}\n\n"
-                        
-                        # If we accumulated text but never sent or closed text block, do it now
-                        if not text_block_closed:
-                            if accumulated_text and not text_sent:
-                                # Send the accumulated text
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': accumulated_text}})}\n\n"
-                            # Close the text block
-                            yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
-                        
                         # Map OpenAI finish_reason to Anthropic stop_reason
-                        stop_reason = "end_turn"
-                        if finish_reason == "length":
-                            stop_reason = "max_tokens"
-                        elif finish_reason == "tool_calls":
-                            stop_reason = "tool_use"
-                        elif finish_reason == "stop":
-                            stop_reason = "end_turn"
-                        
-                        # Send message_delta with stop reason and usage
-                        usage = {"output_tokens": output_tokens}
-                        
-                        yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': stop_reason, 'stop_sequence': None}, 'usage': usage})}\n\n"
-                        
-                        # Send message_stop event
-                        yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
-                        
-                        # Send final [DONE] marker to match Anthropic's behavior
-                        yield "data: [DONE]\n\n"
-                        return
+                        close_stream(STOP_REASON_MAP.get(finish_reason, "end_turn"))
             except Exception as e:
                 # Log error but continue processing other chunks
-                logger.error(f"Error processing chunk: {str(e)}")
-                continue
+                logger.error("Error processing chunk: %s", e)
+            
+            # Send everything this chunk produced as one write
+            if events:
+                yield b"".join(events)
+                events.clear()
+            if has_sent_stop_reason:
+                return
         
         # If we didn't get a finish reason, close any open blocks
         if not has_sent_stop_reason:
-            # Close any open tool call blocks
-            if tool_index is not None:
-                for i in range(1, last_tool_index + 1):
-                    yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': i})}\n\n"
-            
-            # Close the text content block
-            yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
-            
-            # Send final message_delta with usage
-            usage = {"output_tokens": output_tokens}
-            
-            yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None}, 'usage': usage})}\n\n"
-            
-            # Send message_stop event
-            yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
-            
-            # Send final [DONE] marker to match Anthropic's behavior
-            yield "data: [DONE]\n\n"
+            close_stream("end_turn")
+            yield b"".join(events)
     
     except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        error_message = f"Error in streaming: {str(e)}\n\nFull traceback:\n{error_traceback}"
-        logger.error(error_message)
+        logger.error("Error in streaming: %s\n\nFull traceback:\n%s", e, traceback.format_exc())
         
-        # Send error message_delta
-        yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': 'error', 'stop_sequence': None}, 'usage': {'output_tokens': 0}})}\n\n"
+        # Send error message_delta, message_stop and the final [DONE] marker
+        yield STREAM_ERROR_EVENTS
+
+# Error bodies keep FastAPI's {"detail": ...} shape; only the message varies,
+# so it is spliced between pre-serialized halves
+ERROR_BODY_PREFIX, ERROR_BODY_SUFFIX = orjson.dumps({"detail": "__MSG__"}).split(b'"__MSG__"')
+
+# Attributes LiteLLM exceptions may carry, copied into the error details when present
+LITELLM_ERROR_ATTRS = ('message', 'status_code', 'response', 'llm_provider', 'model')
+MISSING = object()
+
+def error_response(status_code: int, message: str) -> Response:
+    """Build a JSON error response from the pre-serialized error template."""
+    return Response(
+        content=ERROR_BODY_PREFIX + dumps_event_json(message) + ERROR_BODY_SUFFIX,
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+# Slice offsets for merging two text delta events: the closing quote plus the suffix of the
+# first, and the prefix plus the opening quote of the second
+TEXT_DELTA_MERGE_TAIL = len(TEXT_DELTA_SUFFIX) + 1
+TEXT_DELTA_MERGE_HEAD = len(TEXT_DELTA_PREFIX) + 1
+
+def is_text_delta_event(frame: bytes) -> bool:
+    """Check whether an encoded chunk is exactly one text delta event."""
+    # JSON escapes newlines inside strings, so a single event has no blank line before its end
+    return (
+        frame.startswith(TEXT_DELTA_PREFIX)
+        and frame.endswith(TEXT_DELTA_SUFFIX)
+        and frame.find(SSE_EVENT_END) == len(frame) - 2
+    )
+
+class BufferedEventStreamResponse(StreamingResponse):
+    """Streaming response that reads ahead from an async generator of encoded SSE events.
+
+    The producer keeps pulling upstream chunks into a bounded queue while the
+    response waits on the client socket, so a slow client and a bursty upstream
+    overlap instead of taking turns. Events that are already queued when the
+    response wakes up are joined into a single write (up to max_batch), which cuts
+    the number of socket writes during bursts without ever waiting for more data.
+    Text deltas that are queued back to back are merged into a single delta event
+    as well. Batches are sent straight from the queue, without another async
+    generator between the queue and the ASGI send. on_close, if given, is called
+    once the response is finished, however it ends.
+    """
+    def __init__(self, content, maxsize: int = 32, max_batch: int = 8, on_close: Optional[Callable[[], None]] = None):
+        super().__init__(content, media_type="text/event-stream")
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    async def stream_response(self, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        buffer = asyncio.Queue(maxsize=self.maxsize)
+        done = object()
+        error = None
+
+        async def produce():
+            nonlocal error
+            try:
+                async for item in self.body_iterator:
+                    await buffer.put(item)
+            except Exception as e:
+                error = e
+            await buffer.put(done)
+
+        # Created from the response's task so it runs on the same loop and context
+        producer = asyncio.create_task(produce())
+        try:
+            finished = False
+            while not finished:
+                item = await buffer.get()
+                if item is done:
+                    break
+                batch = [item]
+                # Coalesce whatever else is ready right now
+                while len(batch) < self.max_batch and not buffer.empty():
+                    item = buffer.get_nowait()
+                    if item is done:
+                        finished = True
+                        break
+                    if is_text_delta_event(item) and is_text_delta_event(batch[-1]):
+                        # Both texts are JSON strings, so dropping the closing quote of the
+                        # first and the opening quote of the second joins them into one
+                        batch[-1] = batch[-1][:-TEXT_DELTA_MERGE_TAIL] + item[TEXT_DELTA_MERGE_HEAD:]
+                    else:
+                        batch.append(item)
+                await send({"type": "http.response.body", "body": b"".join(batch), "more_body": True})
+            if error is not None:
+                raise error
+        finally:
+            # Stop reading upstream if the client went away mid-stream
+            producer.cancel()
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def prepare_litellm_request(request: MessagesRequest) -> Dict[str, Any]:
+    """Build the LiteLLM call arguments for a request, including the API key and OpenAI clean-up."""
+    # Convert Anthropic request to LiteLLM format
+    litellm_request = convert_anthropic_to_litellm(request)
+    
+    # Determine which API key to use based on the model's provider prefix
+    provider_prefix = request.model[:request.model.find("/") + 1]
+    api_key, provider_label = PROVIDER_API_KEYS.get(provider_prefix, (ANTHROPIC_API_KEY, "Anthropic"))
+    litellm_request["api_key"] = api_key
+    logger.debug("Using %s API key for model: %s", provider_label, request.model)
+    
+    # For OpenAI models - modify request format to work with limitations
+    if litellm_model_profile(litellm_request["model"]).flatten_content and "messages" in litellm_request:
+        logger.debug("Processing OpenAI model request: %s", litellm_request['model'])
         
-        # Send message_stop event
-        yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
+        # For OpenAI models, we need to convert content blocks to simple strings
+        # and handle other requirements
+        for i, msg in enumerate(litellm_request["messages"]):
+            # Fast path - plain string content with only role/content keys is already
+            # in the shape OpenAI expects, so there is nothing to convert or strip
+            if isinstance(msg.get("content"), str) and len(msg) == 2:
+                continue
+            
+            # Special case - handle message content directly when it's a list of tool_result
+            # This is a specific case we're seeing in the error
+            if "content" in msg and isinstance(msg["content"], list):
+                is_only_tool_result = True
+                for block in msg["content"]:
+                    if not isinstance(block, dict) or block.get("type") != "tool_result":
+                        is_only_tool_result = False
+                        break
+                
+                if is_only_tool_result and len(msg["content"]) > 0:
+                    logger.warning("Found message with only tool_result content - special handling required")
+                    # Extract the content from all tool_result blocks
+                    all_text = ""
+                    for block in msg["content"]:
+                        all_text += "Tool Result:\n"
+                        result_content = block.get("content", [])
+                        
+                        # Handle different formats of content
+                        if isinstance(result_content, list):
+                            for item in result_content:
+                                if isinstance(item, dict) and item.get("type") == "text":
+                                    all_text += item.get("text", "") + "\n"
+                                elif isinstance(item, dict):
+                                    # Fall back to string representation of any dict
+                                    try:
+                                        item_text = item["text"] if "text" in item else dumps_text(item)
+                                        all_text += item_text + "\n"
+                                    except:
+                                        all_text += str(item) + "\n"
+                        elif isinstance(result_content, str):
+                            all_text += result_content + "\n"
+                        else:
+                            try:
+                                all_text += dumps_text(result_content) + "\n"
+                            except:
+                                all_text += str(result_content) + "\n"
+                    
+                    # Replace the list with extracted text
+                    litellm_request["messages"][i]["content"] = all_text.strip() or "..."
+                    logger.warning("Converted tool_result to plain text: %s...", all_text.strip()[:200])
+                    continue  # Skip normal processing for this message
+            
+            # 1. Handle content field - normal case
+            if "content" in msg:
+                # Check if content is a list (content blocks)
+                if isinstance(msg["content"], list):
+                    # Convert complex content blocks to simple string
+                    text_content = ""
+                    for block in msg["content"]:
+                        if isinstance(block, dict):
+                            # Handle different content block types
+                            block_type = block.get("type")
+                            if block_type == "text":
+                                text_content += block.get("text", "") + "\n"
+                            
+                            # Handle tool_result content blocks - extract nested text
+                            elif block_type == "tool_result":
+                                tool_id = block.get("tool_use_id", "unknown")
+                                text_content += f"[Tool Result ID: {tool_id}]\n"
+                                
+                                # Extract text from the tool_result content
+                                result_content = block.get("content", [])
+                                if isinstance(result_content, list):
+                                    for item in result_content:
+                                        if isinstance(item, dict) and item.get("type") == "text":
+                                            text_content += item.get("text", "") + "\n"
+                                        elif isinstance(item, dict):
+                                            # Handle any dict by trying to extract text or convert to JSON
+                                            if "text" in item:
+                                                text_content += item.get("text", "") + "\n"
+                                            else:
+                                                try:
+                                                    text_content += dumps_text(item) + "\n"
+                                                except:
+                                                    text_content += str(item) + "\n"
+                                elif isinstance(result_content, dict):
+                                    # Handle dictionary content
+                                    if result_content.get("type") == "text":
+                                        text_content += result_content.get("text", "") + "\n"
+                                    else:
+                                        try:
+                                            text_content += dumps_text(result_content) + "\n"
+                                        except:
+                                            text_content += str(result_content) + "\n"
+                                elif isinstance(result_content, str):
+                                    text_content += result_content + "\n"
+                                else:
+                                    try:
+                                        text_content += dumps_text(result_content) + "\n"
+                                    except:
+                                        text_content += str(result_content) + "\n"
+                            
+                            # Handle tool_use content blocks
+                            elif block_type == "tool_use":
+                                tool_name = block.get("name", "unknown")
+                                tool_id = block.get("id", "unknown")
+                                tool_input = dumps_text(block.get("input", {}))
+                                text_content += f"[Tool: {tool_name} (ID: {tool_id})]\nInput: {tool_input}\n\n"
+                            
+                            # Handle image content blocks
+                            elif block_type == "image":
+                                text_content += "[Image content - not displayed in text format]\n"
+                    
+                    # Make sure content is never empty for OpenAI models
+                    if not text_content.strip():
+                        text_content = "..."
+                    
+                    litellm_request["messages"][i]["content"] = text_content.strip()
+                # Also check for None or empty string content
+                elif msg["content"] is None:
+                    litellm_request["messages"][i]["content"] = "..." # Empty content not allowed
+            
+            # 2. Remove any fields OpenAI doesn't support in messages
+            for key in list(msg.keys()):
+                if key not in ["role", "content", "name", "tool_call_id", "tool_calls"]:
+                    logger.warning("Removing unsupported field from message: %s", key)
+                    del msg[key]
         
-        # Send final [DONE] marker
-        yield "data: [DONE]\n\n"
+        # 3. Final validation - check for any remaining invalid values and dump full message details
+        for i, msg in enumerate(litellm_request["messages"]):
+            # Log the message format for debugging
+            logger.debug("Message %s format check - role: %s, content type: %s", i, msg.get('role'), type(msg.get('content')))
+            
+            # If content is still a list or None, replace with placeholder
+            if isinstance(msg.get("content"), list):
+                content_json = json.dumps(msg.get('content'))
+                logger.warning("CRITICAL: Message %s still has list content after processing: %s", i, content_json)
+                # Last resort - stringify the entire content as JSON
+                litellm_request["messages"][i]["content"] = f"Content as JSON: {content_json}"
+            elif msg.get("content") is None:
+                logger.warning("Message %s has None content - replacing with placeholder", i)
+                litellm_request["messages"][i]["content"] = "..." # Fallback placeholder
+
+    return litellm_request
+
+async def stream_message(litellm_request: Dict[str, Any], request: MessagesRequest) -> StreamingResponse:
+    """Start a streaming LiteLLM completion and relay it as Anthropic SSE events."""
+    # The stream slot is held for as long as the upstream stream is open, so it is only
+    # released here if the stream never starts, and otherwise when the response finishes
+    await LLM_STREAM_SEMAPHORE.acquire()
+    try:
+        # Ensure we use the async version for streaming
+        response_generator = await litellm.acompletion(**litellm_request)
+    except BaseException:
+        LLM_STREAM_SEMAPHORE.release()
+        raise
+    
+    return BufferedEventStreamResponse(
+        handle_streaming(response_generator, request),
+        on_close=LLM_STREAM_SEMAPHORE.release
+    )
 
-@app.post("/v1/messages")
+async def complete_message(litellm_request: Dict[str, Any], request: MessagesRequest) -> Response:
+    """Run a non-streaming LiteLLM completion and return it as an Anthropic message."""
+    start_time = time.time()
+    # Use the async client too, so a slow completion does not block the event loop
+    async with LLM_CALL_SEMAPHORE:
+        litellm_response = await litellm.acompletion(**litellm_request)
+    logger.debug("✅ RESPONSE RECEIVED: Model=%s, Time=%.2fs", litellm_request.get('model'), time.time() - start_time)
+    
+    # Convert LiteLLM response to Anthropic format
+    anthropic_response = convert_litellm_to_anthropic(litellm_response, request)
+    
+    # Serialize with pydantic-core
+    return Response(content=anthropic_response.model_dump_json(), media_type="application/json")
+
+@app.post("/v1/messages", response_model=None)
 async def create_message(
     request: MessagesRequest,
-    raw_request: Request
+    raw_request: Request,
+    background_tasks: BackgroundTasks
 ):
     try:
-        # print the body here
-        body = await raw_request.body()
-    
-        # Parse the raw body as JSON since it's bytes
-        body_json = json.loads(body.decode('utf-8'))
-        original_model = body_json.get("model", "unknown")
+        # The validated request already carries the model name the client sent,
+        # so there is no need to parse the raw body a second time
+        original_model = request.original_model or request.model
         
         # Get the display name for logging, just the model name without provider prefix
         display_model = original_model
         if "/" in display_model:
             display_model = display_model.split("/")[-1]
         
-        # Clean model name for capability check
-        clean_model = request.model
-        if clean_model.startswith("anthropic/"):
-            clean_model = clean_model[len("anthropic/"):]
-        elif clean_model.startswith("openai/"):
-            clean_model = clean_model[len("openai/"):]
-        
-        logger.debug(f"📊 PROCESSING REQUEST: Model={request.model}, Stream={request.stream}")
+        logger.debug("📊 PROCESSING REQUEST: Model=%s, Stream=%s", request.model, request.stream)
         
         # Convert Anthropic request to LiteLLM format
-        litellm_request = convert_anthropic_to_litellm(request)
-        
-        # Determine which API key to use based on the model
-        if request.model.startswith("openai/"):
-            litellm_request["api_key"] = OPENAI_API_KEY
-            logger.debug(f"Using OpenAI API key for model: {request.model}")
-        elif request.model.startswith("gemini/"):
-            litellm_request["api_key"] = GEMINI_API_KEY
-            logger.debug(f"Using Gemini API key for model: {request.model}")
-        else:
-            litellm_request["api_key"] = ANTHROPIC_API_KEY
-            logger.debug(f"Using Anthropic API key for model: {request.model}")
-        
-        # For OpenAI models - modify request format to work with limitations
-        if "openai" in litellm_request["model"] and "messages" in litellm_request:
-            logger.debug(f"Processing OpenAI model request: {litellm_request['model']}")
-            
-            # For OpenAI models, we need to convert content blocks to simple strings
-            # and handle other requirements
-            for i, msg in enumerate(litellm_request["messages"]):
-                # Special case - handle message content directly when it's a list of tool_result
-                # This is a specific case we're seeing in the error
-                if "content" in msg and isinstance(msg["content"], list):
-                    is_only_tool_result = True
-                    for block in msg["content"]:
-                        if not isinstance(block, dict) or block.get("type") != "tool_result":
-                            is_only_tool_result = False
-                            break
-                    
-                    if is_only_tool_result and len(msg["content"]) > 0:
-                        logger.warning(f"Found message with only tool_result content - special handling required")
-                        # Extract the content from all tool_result blocks
-                        all_text = ""
-                        for block in msg["content"]:
-                            all_text += "Tool Result:\n"
-                            result_content = block.get("content", [])
-                            
-                            # Handle different formats of content
-                            if isinstance(result_content, list):
-                                for item in result_content:
-                                    if isinstance(item, dict) and item.get("type") == "text":
-                                        all_text += item.get("text", "") + "\n"
-                                    elif isinstance(item, dict):
-                                        # Fall back to string representation of any dict
-                                        try:
-                                            item_text = item.get("text", json.dumps(item))
-                                            all_text += item_text + "\n"
-                                        except:
-                                            all_text += str(item) + "\n"
-                            elif isinstance(result_content, str):
-                                all_text += result_content + "\n"
-                            else:
-                                try:
-                                    all_text += json.dumps(result_content) + "\n"
-                                except:
-                                    all_text += str(result_content) + "\n"
-                        
-                        # Replace the list with extracted text
-                        litellm_request["messages"][i]["content"] = all_text.strip() or "..."
-                        logger.warning(f"Converted tool_result to plain text: {all_text.strip()[:200]}...")
-                        continue  # Skip normal processing for this message
-                
-                # 1. Handle content field - normal case
-                if "content" in msg:
-                    # Check if content is a list (content blocks)
-                    if isinstance(msg["content"], list):
-                        # Convert complex content blocks to simple string
-                        text_content = ""
-                        for block in msg["content"]:
-                            if isinstance(block, dict):
-                                # Handle different content block types
-                                if block.get("type") == "text":
-                                    text_content += block.get("text", "") + "\n"
-                                
-                                # Handle tool_result content blocks - extract nested text
-                                elif block.get("type") == "tool_result":
-                                    tool_id = block.get("tool_use_id", "unknown")
-                                    text_content += f"[Tool Result ID: {tool_id}]\n"
-                                    
-                                    # Extract text from the tool_result content
-                                    result_content = block.get("content", [])
-                                    if isinstance(result_content, list):
-                                        for item in result_content:
-                                            if isinstance(item, dict) and item.get("type") == "text":
-                                                text_content += item.get("text", "") + "\n"
-                                            elif isinstance(item, dict):
-                                                # Handle any dict by trying to extract text or convert to JSON
-                                                if "text" in item:
-                                                    text_content += item.get("text", "") + "\n"
-                                                else:
-                                                    try:
-                                                        text_content += json.dumps(item) + "\n"
-                                                    except:
-                                                        text_content += str(item) + "\n"
-                                    elif isinstance(result_content, dict):
-                                        # Handle dictionary content
-                                        if result_content.get("type") == "text":
-                                            text_content += result_content.get("text", "") + "\n"
-                                        else:
-                                            try:
-                                                text_content += json.dumps(result_content) + "\n"
-                                            except:
-                                                text_content += str(result_content) + "\n"
-                                    elif isinstance(result_content, str):
-                                        text_content += result_content + "\n"
-                                    else:
-                                        try:
-                                            text_content += json.dumps(result_content) + "\n"
-                                        except:
-                                            text_content += str(result_content) + "\n"
-                                
-                                # Handle tool_use content blocks
-                                elif block.get("type") == "tool_use":
-                                    tool_name = block.get("name", "unknown")
-                                    tool_id = block.get("id", "unknown")
-                                    tool_input = json.dumps(block.get("input", {}))
-                                    text_content += f"[Tool: {tool_name} (ID: {tool_id})]\nInput: {tool_input}\n\n"
-                                
-                                # Handle image content blocks
-                                elif block.get("type") == "image":
-                                    text_content += "[Image content - not displayed in text format]\n"
-                        
-                        # Make sure content is never empty for OpenAI models
-                        if not text_content.strip():
-                            text_content = "..."
-                        
-                        litellm_request["messages"][i]["content"] = text_content.strip()
-                    # Also check for None or empty string content
-                    elif msg["content"] is None:
-                        litellm_request["messages"][i]["content"] = "..." # Empty content not allowed
-                
-                # 2. Remove any fields OpenAI doesn't support in messages
-                for key in list(msg.keys()):
-                    if key not in ["role", "content", "name", "tool_call_id", "tool_calls"]:
-                        logger.warning(f"Removing unsupported field from message: {key}")
-                        del msg[key]
-            
-            # 3. Final validation - check for any remaining invalid values and dump full message details
-            for i, msg in enumerate(litellm_request["messages"]):
-                # Log the message format for debugging
-                logger.debug(f"Message {i} format check - role: {msg.get('role')}, content type: {type(msg.get('content'))}")
-                
-                # If content is still a list or None, replace with placeholder
-                if isinstance(msg.get("content"), list):
-                    logger.warning(f"CRITICAL: Message {i} still has list content after processing: {json.dumps(msg.get('content'))}")
-                    # Last resort - stringify the entire content as JSON
-                    litellm_request["messages"][i]["content"] = f"Content as JSON: {json.dumps(msg.get('content'))}"
-                elif msg.get("content") is None:
-                    logger.warning(f"Message {i} has None content - replacing with placeholder")
-                    litellm_request["messages"][i]["content"] = "..." # Fallback placeholder
+        litellm_request = prepare_litellm_request(request)
         
         # Only log basic info about the request, not the full details
-        logger.debug(f"Request for model: {litellm_request.get('model')}, stream: {litellm_request.get('stream', False)}")
+        logger.debug("Request for model: %s, stream: %s", litellm_request.get('model'), litellm_request.get('stream', False))
         
-        # Handle streaming mode
+        # Print the access log after the response is sent, off the request path
+        background_tasks.add_task(
+            log_request_beautifully,
+            "POST", 
+            raw_request.url.path, 
+            display_model, 
+            litellm_request.get('model'),
+            len(litellm_request['messages']),
+            len(request.tools),
+            200  # Assuming success at this point
+        )
+        
+        # Pick the specialized handler up front
         if request.stream:
-            # Use LiteLLM for streaming
-            num_tools = len(request.tools) if request.tools else 0
-            
-            log_request_beautifully(
-                "POST", 
-                raw_request.url.path, 
-                display_model, 
-                litellm_request.get('model'),
-                len(litellm_request['messages']),
-                num_tools,
-                200  # Assuming success at this point
-            )
-            # Ensure we use the async version for streaming
-            response_generator = await litellm.acompletion(**litellm_request)
-            
-            return StreamingResponse(
-                handle_streaming(response_generator, request),
-                media_type="text/event-stream"
-            )
-        else:
-            # Use LiteLLM for regular completion
-            num_tools = len(request.tools) if request.tools else 0
-            
-            log_request_beautifully(
-                "POST", 
-                raw_request.url.path, 
-                display_model, 
-                litellm_request.get('model'),
-                len(litellm_request['messages']),
-                num_tools,
-                200  # Assuming success at this point
-            )
-            start_time = time.time()
-            litellm_response = litellm.completion(**litellm_request)
-            logger.debug(f"✅ RESPONSE RECEIVED: Model={litellm_request.get('model')}, Time={time.time() - start_time:.2f}s")
-            
-            # Convert LiteLLM response to Anthropic format
-            anthropic_response = convert_litellm_to_anthropic(litellm_response, request)
-            
-            return anthropic_response
+            return await stream_message(litellm_request, request)
+        return await complete_message(litellm_request, request)
                 
     except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        
         # Capture as much info as possible about the error
         error_details = {
             "error": str(e),
-            "type": type(e).__name__,
-            "traceback": error_traceback
+            "type": type(e).__name__
         }
         
-        # Check for LiteLLM-specific attributes
-        for attr in ['message', 'status_code', 'response', 'llm_provider', 'model']:
-            if hasattr(e, attr):
-                error_details[attr] = getattr(e, attr)
+        # Upstream errors (rate limits, outages) all land here and tend to arrive in bursts,
+        # so only pay for formatting the traceback when debug logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            error_details["traceback"] = traceback.format_exc()
+        
+        # Check for LiteLLM-specific attributes, with one attribute lookup each
+        for attr in LITELLM_ERROR_ATTRS:
+            value = getattr(e, attr, MISSING)
+            if value is not MISSING:
+                error_details[attr] = value
         
         # Check for additional exception details in dictionaries
         if hasattr(e, '__dict__'):
@@ -1321,7 +1609,7 @@ async def create_message(
                     error_details[key] = str(value)
         
         # Log all error details
-        logger.error(f"Error processing request: {json.dumps(error_details, indent=2)}")
+        logger.error("Error processing request: %s", json.dumps(error_details, indent=2, default=str))
         
         # Format error for response
         error_message = f"Error: {str(e)}"
@@ -1332,12 +1620,13 @@ async def create_message(
         
         # Return detailed error
         status_code = error_details.get('status_code', 500)
-        raise HTTPException(status_code=status_code, detail=error_message)
+        return error_response(status_code, error_message)
 
-@app.post("/v1/messages/count_tokens")
+@app.post("/v1/messages/count_tokens", response_model=None)
 async def count_tokens(
     request: TokenCountRequest,
-    raw_request: Request
+    raw_request: Request,
+    background_tasks: BackgroundTasks
 ):
     try:
         # Log the incoming token count request
@@ -1348,22 +1637,17 @@ async def count_tokens(
         if "/" in display_model:
             display_model = display_model.split("/")[-1]
         
-        # Clean model name for capability check
-        clean_model = request.model
-        if clean_model.startswith("anthropic/"):
-            clean_model = clean_model[len("anthropic/"):]
-        elif clean_model.startswith("openai/"):
-            clean_model = clean_model[len("openai/"):]
-        
-        # Convert the messages to a format LiteLLM can understand
+        # Convert the messages to a format LiteLLM can understand. Every field was already
+        # validated (and the model mapped) as part of the TokenCountRequest, so skip validation.
+        # Only the model and messages are counted, so the tool schemas are not converted
         converted_request = convert_anthropic_to_litellm(
-            MessagesRequest(
+            MessagesRequest.model_construct(
                 model=request.model,
                 max_tokens=100,  # Arbitrary value not used for token counting
                 messages=request.messages,
                 system=request.system,
-                tools=request.tools,
-                tool_choice=request.tool_choice,
+                tools=[],
+                tool_choice=None,
                 thinking=request.thinking
             )
         )
@@ -1374,15 +1658,15 @@ async def count_tokens(
             from litellm import token_counter
             
             # Log the request beautifully
-            num_tools = len(request.tools) if request.tools else 0
-            
-            log_request_beautifully(
+            # Print the access log after the response is sent, off the request path
+            background_tasks.add_task(
+                log_request_beautifully,
                 "POST",
                 raw_request.url.path,
                 display_model,
                 converted_request.get('model'),
                 len(converted_request['messages']),
-                num_tools,
+                len(request.tools),
                 200  # Assuming success at this point
             )
             
@@ -1393,18 +1677,23 @@ async def count_tokens(
             )
             
             # Return Anthropic-style response
-            return TokenCountResponse(input_tokens=token_count)
+            return Response(
+                content=orjson.dumps({"input_tokens": token_count}),
+                media_type="application/json"
+            )
             
         except ImportError:
             logger.error("Could not import token_counter from litellm")
             # Fallback to a simple approximation
-            return TokenCountResponse(input_tokens=1000)  # Default fallback
+            return Response(
+                content=orjson.dumps({"input_tokens": 1000}),  # Default fallback
+                media_type="application/json"
+            )
             
     except Exception as e:
-        import traceback
         error_traceback = traceback.format_exc()
-        logger.error(f"Error counting tokens: {str(e)}\n{error_traceback}")
-        raise HTTPException(status_code=500, detail=f"Error counting tokens: {str(e)}")
+        logger.error("Error counting tokens: %s\n%s", e, error_traceback)
+        return error_response(500, f"Error counting tokens: {str(e)}")
 
 @app.get("/")
 async def root():
@@ -1422,44 +1711,38 @@ class Colors:
     BOLD = "\033[1m"
     UNDERLINE = "\033[4m"
     DIM = "\033[2m"
+# The access log line only varies in its fields, so the colors are baked into one format
+# string and the line is formatted by the log listener thread from the record's args
+ACCESS_LOG_FORMAT = (
+    f"{Colors.BOLD}%s %s{Colors.RESET} %s\n"
+    f"{Colors.CYAN}%s{Colors.RESET} → {Colors.GREEN}%s{Colors.RESET} "
+    f"{Colors.MAGENTA}%s tools{Colors.RESET} {Colors.BLUE}%s messages{Colors.RESET}"
+)
+ACCESS_LOG_STATUS_OK = f"{Colors.GREEN}✓ 200 OK{Colors.RESET}"
+
 def log_request_beautifully(method, path, claude_model, openai_model, num_messages, num_tools, status_code):
     """Log requests in a beautiful, twitter-friendly format showing Claude to OpenAI mapping."""
-    # Format the Claude model name nicely
-    claude_display = f"{Colors.CYAN}{claude_model}{Colors.RESET}"
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
     
     # Extract endpoint name
-    endpoint = path
-    if "?" in endpoint:
-        endpoint = endpoint.split("?")[0]
+    endpoint = path.split("?", 1)[0]
     
     # Extract just the OpenAI model name without provider prefix
-    openai_display = openai_model
-    if "/" in openai_display:
-        openai_display = openai_display.split("/")[-1]
-    openai_display = f"{Colors.GREEN}{openai_display}{Colors.RESET}"
-    
-    # Format tools and messages
-    tools_str = f"{Colors.MAGENTA}{num_tools} tools{Colors.RESET}"
-    messages_str = f"{Colors.BLUE}{num_messages} messages{Colors.RESET}"
+    openai_display = openai_model.rsplit("/", 1)[-1]
     
     # Format status code
-    status_str = f"{Colors.GREEN}✓ {status_code} OK{Colors.RESET}" if status_code == 200 else f"{Colors.RED}✗ {status_code}{Colors.RESET}"
-    
-
-    # Put it all together in a clear, beautiful format
-    log_line = f"{Colors.BOLD}{method} {endpoint}{Colors.RESET} {status_str}"
-    model_line = f"{claude_display} → {openai_display} {tools_str} {messages_str}"
+    status_str = ACCESS_LOG_STATUS_OK if status_code == 200 else f"{Colors.RED}✗ {status_code}{Colors.RESET}"
     
     # Print to console
-    print(log_line)
-    print(model_line)
-    sys.stdout.flush()
+    access_logger.info(ACCESS_LOG_FORMAT, method, endpoint, status_str, claude_model, openai_display, num_tools, num_messages)
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1 and sys.argv[1] == "--help":
         print("Run with: uvicorn server:app --reload --host 0.0.0.0 --port 8082")
         sys.exit(0)
     
-    # Configure uvicorn to run with minimal logs
-    uvicorn.run(app, host="0.0.0.0", port=8082, log_level="error")
\ No newline at end of file
+    # Configure uvicorn to run with minimal logs. Its default loop="auto"/http="auto"
+    # settings pick uvloop and httptools (both dependencies) when they are installed,
+    # and fall back to asyncio and h11 where they are not (uvloop has no Windows build)
+    uvicorn.run(app, host="0.0.0.0", port=8082, log_level="error", loop="auto", http="auto")
\ No newline at end of file